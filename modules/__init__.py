@@ -1,3 +1,5 @@
 from .code import AccessManagement
 from .logger import activate_logger
-from .utils import UnitTest
\ No newline at end of file
+from .utils import UnitTest
+from .account import AccountManagement
+from .groups import GroupManagement
\ No newline at end of file
@@ -0,0 +1,242 @@
+import json
+from modules.logger import activate_logger
+from modules.concurrency import ConcurrencyLimiter
+from modules.transport import Transport, RequestsTransport
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, quote
+
+class AccountManagement():
+    def __init__(self, display_name: str, account_hostname: str, account_id: str, token: str, workspace_ids: list, action: str, app_id: str = '', permission: str = 'ADMIN', logger: str = '', limiter: ConcurrencyLimiter = None, transport: Transport = None):
+        self.app_id = app_id
+        self.sp_id = None
+        self.display_name = display_name
+        self.account_hostname = account_hostname
+        self.account_id = account_id
+        self.token = token
+        self.workspace_ids = workspace_ids
+        self.action = action
+        self.permission = permission
+
+        ### Activating logger if it's not passed as a parameter
+        if logger != '':
+            self.logger = logger
+        else:
+            self.logger = activate_logger()
+
+        ### Activating concurrency limiter if it's not passed as a parameter. The account API gets its own limiter.
+        if limiter is not None:
+            self.limiter = limiter
+        else:
+            self.limiter = ConcurrencyLimiter.for_host(self.account_hostname, logger = self.logger)
+
+        ### Using requests over HTTP/1.1 if transport isn't passed as a parameter. Sharing one transport between instances reuses the connections.
+        if transport is not None:
+            self.transport = transport
+        else:
+            self.transport = RequestsTransport()
+
+        ### Running unit tests
+        self.run_tests()
+
+    def run_tests(self) -> None:
+        '''
+        Calling all account level unit tests
+        '''
+        self.validate_inputs()
+        self.validate_action()
+        self.validate_permission()
+        self.validate_workspace_ids()
+        self.logger.info("All account level tests have been executed.")
+
+    def validate_inputs(self) -> None:
+        '''
+        Validates the input parameters to ensure each one is a non-empty string.
+        Raises ValueError if any input is not a string or if it is an empty string.
+        '''
+        inputs = {'display_name': self.display_name, 'account_hostname': self.account_hostname, 'account_id': self.account_id, 'token': self.token}
+
+        for name, input in inputs.items():
+            if not isinstance(input, str):
+                raise ValueError(f"Expected string for {name} but got {type(input).__name__}")
+            elif not input:
+                raise ValueError(f"String cannot be empty for {name}")
+
+        self.logger.info(f"Validate account level inputs unit test has been passed")
+
+    def validate_action(self) -> None:
+        '''
+        Validates 'action' input parameter. It can be 'create' or 'delete' only.
+        '''
+        if not isinstance(self.action, str) or self.action.lower() not in ['create', 'delete']:
+            raise ValueError(f"Invalid action: {self.action}. Allowed values are 'create' or 'delete'.")
+
+        self.logger.info(f"Validate 'action' input parameter unit test has been passed")
+
+    def validate_permission(self) -> None:
+        '''
+        Validates 'permission' input parameter. It can be 'USER' or 'ADMIN' only.
+        '''
+        if not isinstance(self.permission, str) or self.permission.upper() not in ['USER', 'ADMIN']:
+            raise ValueError(f"Invalid permission: {self.permission}. Allowed values are 'USER' or 'ADMIN'.")
+        self.permission = self.permission.upper()
+
+        if self.permission == 'USER':
+            self.logger.warning("'USER' permission doesn't grant workspace admin rights. Workspace entitlements are granted with AccessManagement(provisioning = 'account').")
+        self.logger.info(f"Validate 'permission' input parameter unit test has been passed")
+
+    def validate_workspace_ids(self) -> None:
+        '''
+        Validates 'workspace_ids' input parameter. It must be a non-empty list of workspace IDs as non-empty strings or integers.
+        '''
+        if not isinstance(self.workspace_ids, list) or len(self.workspace_ids) == 0:
+            raise ValueError("'workspace_ids' must be a non-empty list.")
+
+        for workspace_id in self.workspace_ids:
+            if isinstance(workspace_id, bool) or not isinstance(workspace_id, (str, int)):
+                raise ValueError(f"Expected string or integer for workspace ID but got {type(workspace_id).__name__}")
+            elif str(workspace_id).strip() == '':
+                raise ValueError("Workspace ID cannot be empty")
+
+        self.logger.info(f"Validate 'workspace_ids' input parameter unit test has been passed")
+
+    def send_request(self, method: str, url: str, payload: dict = None):
+        '''
+        All HTTP calls are sent through the adaptive concurrency limiter.
+        '''
+        headers = {'Authorization': 'Bearer %s' % self.token}
+        data = json.dumps(payload) if payload is not None else None
+        ### Latency is tracked per endpoint, e.g. 'PUT /api/2.0/accounts/<account_id>/workspaces/<workspace_id>/permissionassignments/principals'
+        key = f"{method} {urlparse(url).path.rsplit('/', 1)[0]}"
+        return self.limiter.call(self.transport.request, method, url, data=data, headers=headers, key=key)
+
+    def run_concurrently(self, function, items: list) -> None:
+        '''
+        Runs the function for every item concurrently. Actual parallelism is controlled by the concurrency limiter.
+        '''
+        with ThreadPoolExecutor(max_workers = self.limiter.max_limit) as executor:
+            for future in [executor.submit(function, item) for item in items]:
+                future.result()
+
+    def fetching_service_principals(self, scim_filter: str) -> list:
+        '''
+        The function fetches account level Service Principals matching the SCIM filter, e.g. 'displayName eq "ikidata_sp"'.
+        '''
+        api_version = '/api/2.0'
+        api_command = f'/accounts/{self.account_id}/scim/v2/ServicePrincipals?filter={quote(scim_filter)}'
+        url = f"{self.account_hostname}{api_version}{api_command}"
+
+        resp = self.send_request('GET', url)
+        assert resp.status_code == 200, f"Fetching Service Principals with filter '{scim_filter}' has failed. Reason: {resp.status_code} {resp.text}"
+        return resp.json().get('Resources', [])
+
+    def fetching_service_principal_id(self) -> str:
+        '''
+        The function fetches account level Service Principal ID for the chosen Application ID.
+        '''
+        for sp in self.fetching_service_principals(f'applicationId eq "{self.app_id}"'):
+            if sp.get('applicationId') == self.app_id:
+                return sp.get('id')
+        raise Exception(f"Service Principal with Application ID {self.app_id} not found from the account")
+
+    def service_principal_management(self) -> None:
+        '''
+        Input parameters:
+        token: str
+        Account admin token.
+
+        account_hostname str:
+        Databricks account console hostname in the next format:
+        https://accounts.azuredatabricks.net
+
+        account_id: str
+        Databricks account ID.
+
+        display_name: str
+        Display name for Databricks Service Principal in Databricks account. It can't be empty.
+
+        action: str
+        It can be "create" or "delete". The Service Principal is created only once on account level and its Application ID can be reused in every workspace.
+        When app_id is empty, an existing Service Principal with the same display name is reused instead of creating a duplicate.
+        '''
+
+        api_version = '/api/2.0'
+        api_command = f'/accounts/{self.account_id}/scim/v2/ServicePrincipals'
+        url = f"{self.account_hostname}{api_version}{api_command}"
+
+        if self.action.lower() == 'create':
+            ### Databricks allows duplicate display names, so without app_id the existing Service Principal is looked up by display name
+            if self.app_id is None or self.app_id == '':
+                existing = [sp for sp in self.fetching_service_principals(f'displayName eq "{self.display_name}"') if sp.get('displayName') == self.display_name]
+                if len(existing) > 1:
+                    raise Exception(f"There are {len(existing)} account level Service Principals with name {self.display_name}. Please pass app_id to choose the correct one.")
+                elif len(existing) == 1:
+                    self.logger.info(f"Account level Service Principal {self.display_name} already exists.")
+                    self.app_id = existing[0]['applicationId']
+                    self.sp_id = existing[0]['id']
+                    return None
+
+            payload = {'displayName': self.display_name,
+                       'active': True}
+            if self.app_id is not None and self.app_id != '':
+                payload['applicationId'] = self.app_id
+
+            resp = self.send_request('POST', url, payload)
+            assert (resp.status_code == 201) | (resp.status_code == 409), f"Creating account level Service Principal {self.display_name} has failed. Reason: {resp.status_code} {resp.json()}"
+            if resp.status_code == 409:
+                self.logger.info(f"Account level Service Principal {self.display_name} already exists.")
+                self.sp_id = self.fetching_service_principal_id()
+            else:
+                self.logger.info(f"Creating account level Service Principal {self.display_name} has succeeded.")
+                self.app_id = resp.json()['applicationId']
+                self.sp_id = resp.json()['id']
+
+        elif self.action.lower() == 'delete':
+            assert (self.app_id != None and self.app_id != ''), 'Service Principal App ID was empty. Please check it again.'
+            if self.sp_id is None:
+                self.sp_id = self.fetching_service_principal_id()
+
+            resp = self.send_request('DELETE', f"{url}/{self.sp_id}")
+            assert resp.status_code == 204, f"Deleting account level Service Principal with Application ID {self.app_id} has failed. Reason: {resp.status_code} {resp.text}"
+            self.logger.info(f"Deleting account level Service Principal with Application ID {self.app_id} has succeeded.")
+
+        else:
+            self.logger.warning(f"Wrong action input parameter. It can be 'create' or 'delete' and you used {self.action}")
+
+    def workspace_assignment_management(self) -> None:
+        '''
+        Input parameters:
+        workspace_ids: list
+        Workspace IDs where the account level Service Principal will be assigned to or removed from. Assignments are done concurrently.
+
+        permission: str
+        It can be "USER" or "ADMIN". "ADMIN" grants workspace admin rights, so the Service Principal doesn't need to be added to the "admins" group separately.
+
+        action: str
+        It can be "create" or "delete".
+        '''
+
+        if self.action.lower() not in ['create', 'delete']:
+            self.logger.warning(f"Wrong action input parameter. It can be 'create' or 'delete' and you used {self.action}")
+            return None
+
+        if self.sp_id is None:
+            assert (self.app_id != None and self.app_id != ''), 'Service Principal App ID was empty. Please check it again.'
+            self.sp_id = self.fetching_service_principal_id()
+
+        api_version = '/api/2.0'
+
+        def assign_workspace(workspace_id: str) -> None:
+            api_command = f'/accounts/{self.account_id}/workspaces/{workspace_id}/permissionassignments/principals/{self.sp_id}'
+            url = f"{self.account_hostname}{api_version}{api_command}"
+
+            if self.action.lower() == 'create':
+                payload = {'permissions': [self.permission]}
+                resp = self.send_request('PUT', url, payload)
+                assert resp.status_code == 200, f"Assigning Application ID {self.app_id} to workspace {workspace_id} has failed. Reason: {resp.status_code} {resp.text}"
+                self.logger.info(f"Assigning Application ID {self.app_id} to workspace {workspace_id} with {self.permission} permission has succeeded.")
+            else:
+                resp = self.send_request('DELETE', url)
+                assert resp.status_code == 200, f"Removing Application ID {self.app_id} from workspace {workspace_id} has failed. Reason: {resp.status_code} {resp.text}"
+                self.logger.info(f"Removing Application ID {self.app_id} from workspace {workspace_id} has succeeded.")
+
+        self.run_concurrently(assign_workspace, self.workspace_ids)
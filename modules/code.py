@@ -1,13 +1,17 @@
 import json
-import requests
 import logging
 #from modules import activate_logger, UnitTest
 from modules.logger import activate_logger
 from modules.utils import UnitTest
+from modules.groups import GroupManagement
+from modules.concurrency import ConcurrencyLimiter
+from modules.transport import Transport, RequestsTransport
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 import pandas as pd
 
 class AccessManagement():
-    def __init__(self, display_name: str, catalog_name: str, scope_name: str, server_hostname: str, token: str, sp_type: str, action: str, cloud_provider: str, app_id: str = '', logger: str = ''):
+    def __init__(self, display_name: str, catalog_name: str, scope_name: str, server_hostname: str, token: str, sp_type: str, action: str, cloud_provider: str, app_id: str = '', logger: str = '', limiter: ConcurrencyLimiter = None, transport: Transport = None, provisioning: str = 'workspace'):
         self.app_id = app_id
         self.display_name = display_name
         self.catalog_name = catalog_name
@@ -17,12 +21,25 @@ class AccessManagement():
         self.sp_type = sp_type
         self.action = action
         self.cloud_provider = cloud_provider
+        self.provisioning = provisioning
 
         ### Activating logger if it's not passed as a parameter
         if logger != '':
             self.logger = logger
         else:
             self.logger = activate_logger() 
+
+        ### Activating concurrency limiter if it's not passed as a parameter. Every workspace gets its own limiter, shared by the instances calling it.
+        if limiter is not None:
+            self.limiter = limiter
+        else:
+            self.limiter = ConcurrencyLimiter.for_host(self.server_hostname, logger = self.logger)
+
+        ### Using requests over HTTP/1.1 if transport isn't passed as a parameter. Sharing one transport between instances reuses the connections.
+        if transport is not None:
+            self.transport = transport
+        else:
+            self.transport = RequestsTransport()
         
         ### Running unit tests
         self.run_tests()
@@ -32,8 +49,9 @@ class AccessManagement():
             '''
             Calling all unit tests
             '''
-            self.test = UnitTest(self.app_id, self.display_name, self.catalog_name, self.scope_name, self.server_hostname, self.token, self.sp_type, self.action, self.cloud_provider, self.logger)
+            self.test = UnitTest(self.app_id, self.display_name, self.catalog_name, self.scope_name, self.server_hostname, self.token, self.sp_type, self.action, self.cloud_provider, self.logger, self.provisioning, self.transport, self.limiter)
             self.test.validate_inputs()
+            self.test.validate_provisioning()
             self.test.validate_sp_type()
             self.test.validate_action()
             self.test.validate_cloud_provider()
@@ -41,30 +59,36 @@ class AccessManagement():
                 self.test.validate_azure_app_id()
             self.test.validate_catalog_name()
             self.test.validate_databricks_url()
-            self.test.validating_existing_service_principals()
+            ### Account level Service Principals are assigned to the workspace, so the display name is expected to exist already
+            if self.provisioning == 'workspace':
+                self.test.validating_existing_service_principals()
             self.logger.info("All tests have been executed.")  
     
-    def fetching_admin_group_id(self) -> str:
+    def send_request(self, method: str, url: str, payload: dict = None):
         '''
-        The function fetches admin group ID for the chosen workspace.
+        All HTTP calls are sent through the adaptive concurrency limiter.
         '''
-        api_version = '/api/2.0'
-        api_command = '/preview/scim/v2/Groups'  
-        url = f"{self.server_hostname}{api_version}{api_command}"
         headers = {'Authorization': 'Bearer %s' % self.token}
+        data = json.dumps(payload) if payload is not None else None
+        ### Latency is tracked per endpoint, e.g. 'PATCH /api/2.1/unity-catalog/permissions/table'
+        key = f"{method} {urlparse(url).path.rsplit('/', 1)[0]}"
+        return self.limiter.call(self.transport.request, method, url, data=data, headers=headers, key=key)
+
+    def run_concurrently(self, function, items: list) -> None:
+        '''
+        Runs the function for every item concurrently. Actual parallelism is controlled by the concurrency limiter.
+        '''
+        with ThreadPoolExecutor(max_workers = self.limiter.max_limit) as executor:
+            for future in [executor.submit(function, item) for item in items]:
+                future.result()
 
-        session = requests.Session()
-        resp = session.request('GET', url, verify = True, headers=headers) 
-        groups = resp.json().get('Resources', [])  
-        admin_group_id = None  
-        for group in groups:  
-            if group.get('displayName') == 'admins':  
-                admin_group_id = group.get('id')  
-                return admin_group_id 
-        if not admin_group_id:  
-            raise Exception('Admin group not found')  
+    def fetching_admin_group_id(self) -> str:
+        '''
+        The function fetches admin group ID for the chosen workspace.
+        '''
+        groups = GroupManagement(self.server_hostname, self.token, self.action, self.logger, self.limiter, self.transport)
+        return groups.fetching_group_ids(['admins'])['admins']
 
-        
     def service_principal_management(self) -> None:
         '''
         Input parameters:
@@ -80,9 +104,34 @@ class AccessManagement():
 
         action: str
         It can be "create" or "delete".
+
+        provisioning: str
+        When "account" is used, the Service Principal is created and deleted with AccountManagement. On create, only the workspace entitlements are granted to the assigned Service Principal.
         '''
 
-        if self.action.lower() == 'create':
+        if self.provisioning == 'account' and self.action.lower() == 'create':
+            ### Account level creation doesn't grant workspace entitlements, so they are added to the assigned Service Principal
+            groups = GroupManagement(self.server_hostname, self.token, self.action, self.logger, self.limiter, self.transport)
+            sp_id = groups.fetching_service_principal_ids([self.app_id])[self.app_id]
+
+            api_version = '/api/2.0'
+            api_command = f'/preview/scim/v2/ServicePrincipals/{sp_id}'
+            url = f"{self.server_hostname}{api_version}{api_command}"
+            payload = {'schemas': ['urn:ietf:params:scim:api:messages:2.0:PatchOp'],
+                'Operations': [{'op': 'add',
+                    'path': 'entitlements',
+                    'value': [{'value': 'workspace-access'},
+                        {'value': 'databricks-sql-access'},
+                        {'value': 'allow-cluster-create'}]}]}
+
+            resp = self.send_request('PATCH', url, payload) 
+            assert resp.status_code in [200, 204], f"Granting entitlements to Application ID {self.app_id} has failed. Reason: {resp.status_code} {resp.text}"
+            self.logger.info(f"Granting entitlements to account level Service Principal with Application ID {self.app_id} has succeeded.")
+
+        elif self.provisioning == 'account':
+            self.logger.info(f"Service Principal with Application ID {self.app_id} is managed on account level. Skipping workspace level Service Principal deletion.")
+
+        elif self.action.lower() == 'create':
 
             ### Fetching Admin Group ID
             admin_group_id = self.fetching_admin_group_id()
@@ -90,7 +139,6 @@ class AccessManagement():
             api_version = '/api/2.0'
             api_command = '/preview/scim/v2/ServicePrincipals'
             url = f"{self.server_hostname}{api_version}{api_command}"
-            headers = {'Authorization': 'Bearer %s' % self.token}
 
             ### Using correct payload based in Service Principal type
             if self.app_id is None or self.app_id == '':  
@@ -110,8 +158,7 @@ class AccessManagement():
                 'active': True}
 
 
-            session = requests.Session()
-            resp = session.request('POST', url, data=json.dumps(payload), verify = True, headers=headers) 
+            resp = self.send_request('POST', url, payload) 
             assert (resp.status_code == 201) | (resp.status_code == 409), f"Creating Service Principal {self.display_name} has failed. Reason: {resp.status_code} {resp.json()}"
             if resp.status_code == 409:
                 self.logger.info(f"Service Principal {self.display_name} already exists.")
@@ -124,9 +171,7 @@ class AccessManagement():
             api_version = '/api/2.0'
             api_command = '/preview/scim/v2/ServicePrincipals'
             url = f"{self.server_hostname}{api_version}{api_command}"
-            headers = {'Authorization': 'Bearer %s' % self.token}
-            session = requests.Session()
-            resp = session.request('GET', url, verify = True, headers=headers) 
+            resp = self.send_request('GET', url) 
 
             for sp in resp.json()['Resources']:
                 if sp['applicationId'] == self.app_id:
@@ -137,10 +182,8 @@ class AccessManagement():
 
             api_command = f'/preview/scim/v2/ServicePrincipals/{sp_id}'
             url = f"{self.server_hostname}{api_version}{api_command}"
-            headers = {'Authorization': 'Bearer %s' % self.token}
 
-            session = requests.Session()
-            resp = session.request('DELETE', url, verify = True, headers=headers) 
+            resp = self.send_request('DELETE', url) 
             assert resp.status_code == 204, f"Deleting Service Principal {sp_display_name} with Application ID {self.app_id} has failed. Reason: {resp.json()}"
             self.logger.info(f"Deleting Service Principal {sp_display_name} with Application ID {self.app_id} has succeeded.")
         
@@ -168,19 +211,15 @@ class AccessManagement():
             api_version = '/api/2.0' 
             api_command = '/workspace/mkdirs'
             url = f"{self.server_hostname}{api_version}{api_command}"
-            headers = {'Authorization': 'Bearer %s' % self.token}
-            session = requests.Session()
             payload = {"path": "/Ikidata"}
-            resp = session.request('POST', url, data=json.dumps(payload), verify = True, headers=headers)
+            resp = self.send_request('POST', url, payload)
             assert resp.status_code == 200, f"Creating path '/Ikidata' has failed. Reason: {resp.json()['message']}"
             self.logger.info(f"Path '/Ikidata' has been created")
 
             api_command = '/workspace/list'
             url = f"{self.server_hostname}{api_version}{api_command}"
-            headers = {'Authorization': 'Bearer %s' % self.token}
-            session = requests.Session()
             payload = {"path": "/Workspace"}
-            resp = session.request('GET', url, data=json.dumps(payload), verify = True, headers=headers)
+            resp = self.send_request('GET', url, payload)
             assert resp.status_code == 200, f"Fetching workspace object ID has failed. Reason: {resp.json()['message']}"
         
             for object in resp.json()['objects']:
@@ -191,8 +230,6 @@ class AccessManagement():
 
             api_command = f'/permissions/directories/{object_id}'
             url = f"{self.server_hostname}{api_version}{api_command}"
-            headers = {'Authorization': 'Bearer %s' % self.token}
-            session = requests.Session()
 
             payload = {
             "access_control_list": [
@@ -202,7 +239,7 @@ class AccessManagement():
                 }
             ]
             }
-            resp = session.request('PUT', url, data=json.dumps(payload), verify = True, headers=headers)
+            resp = self.send_request('PUT', url, payload)
             assert resp.status_code == 200, f"Adding 'CAN MANAGE' permissions to '/Workspace/Ikidata' object has failed. Reason: {resp.json()['message']}"
             self.logger.info(f"'CAN MANAGE' permissions has been added to {self.app_id} successfully.")
 
@@ -210,11 +247,9 @@ class AccessManagement():
             api_version = '/api/2.0' 
             api_command = '/workspace/delete'
             url = f"{self.server_hostname}{api_version}{api_command}"
-            headers = {'Authorization': 'Bearer %s' % self.token}
-            session = requests.Session()
             payload = {"path": "/Ikidata",
                     "recursive": "true"}
-            resp = session.request('POST', url, data=json.dumps(payload), verify = True, headers=headers)
+            resp = self.send_request('POST', url, payload)
             assert resp.status_code == 200, f"Deleting path '/Ikidata' has failed. Reason: {resp.json()['message']}"
             self.logger.info(f"Path '/Ikidata' has been deleted")
         else:
@@ -246,8 +281,6 @@ class AccessManagement():
             api_version = '/api/2.1'
             api_command = f'/unity-catalog/permissions/{securable_type}/{catalog_name}'
             url = f"{self.server_hostname}{api_version}{api_command}"
-            headers = {'Authorization': 'Bearer %s' % self.token}
-            session = requests.Session()
             payload = {
             "changes": [
                 {
@@ -256,18 +289,16 @@ class AccessManagement():
                     "USE_CATALOG"
                 ]}]}
 
-            resp = session.request('PATCH', url, data=json.dumps(payload), verify = True, headers=headers) 
+            resp = self.send_request('PATCH', url, payload) 
             assert resp.status_code == 200, f"Granting USE CATALOG permission on {catalog_name} to Application ID {self.app_id} has failed. Reason: {resp.json()}"
             self.logger.info(f"Granting USE CATALOG permission on {catalog_name} to Application ID {self.app_id} has succeeded")
 
             schema_list = ['system.access', 'system.billing', 'system.compute', 'system.information_schema', 'system.lakeflow']
             securable_type = 'schema'
 
-            for schema_name in schema_list:
+            def grant_schema(schema_name: str) -> None:
                 api_command = f'/unity-catalog/permissions/{securable_type}/{schema_name}'
                 url = f"{self.server_hostname}{api_version}{api_command}"
-                headers = {'Authorization': 'Bearer %s' % self.token}
-                session = requests.Session()
                 payload = {
                 "changes": [
                     {
@@ -276,20 +307,19 @@ class AccessManagement():
                         "USE_SCHEMA"
                     ]}]}
 
-                resp = session.request('PATCH', url, data=json.dumps(payload), verify = True, headers=headers) 
+                resp = self.send_request('PATCH', url, payload) 
                 assert resp.status_code == 200, f"Granting USE SCHEMA permission on {schema_name} to Application ID {self.app_id} has failed. Reason: {resp.json()}"
                 self.logger.info(f"Granting USE SCHEMA permission on {schema_name} to Application ID {self.app_id} has succeeded")
 
+            self.run_concurrently(grant_schema, schema_list)
+
             tables_list = ['system.access.audit', 'system.billing.list_prices', 'system.billing.usage', 'system.compute.clusters', 'system.information_schema.table_privileges', 'system.information_schema.schema_privileges', 'system.information_schema.catalog_privileges', 'system.information_schema.volume_privileges', 'system.information_schema.catalogs', 'system.information_schema.catalog_tags', 'system.information_schema.schemata', 'system.information_schema.schema_tags', 'system.information_schema.tables', 'system.information_schema.table_tags', 'system.lakeflow.jobs']
             securable_type = 'table'
 
-            for table_name in tables_list:
-
+            def grant_table(table_name: str) -> None:
                 api_version = '/api/2.1'
                 api_command = f'/unity-catalog/permissions/{securable_type}/{table_name}'
                 url = f"{self.server_hostname}{api_version}{api_command}"
-                headers = {'Authorization': 'Bearer %s' % self.token}
-                session = requests.Session()
                 payload = {
             "changes": [
                 {
@@ -298,10 +328,12 @@ class AccessManagement():
                     "SELECT"
                 ]}]}
 
-                resp = session.request('PATCH', url, data=json.dumps(payload), verify = True, headers=headers) 
+                resp = self.send_request('PATCH', url, payload) 
                 assert resp.status_code == 200, f"Granting SELECT permission on {table_name} to Application ID {self.app_id} has failed. Reason: {resp.json()}"
                 self.logger.info(f"Granting USE SELECT permission on {table_name} to Application ID {self.app_id} has succeeded")
 
+            self.run_concurrently(grant_table, tables_list)
+
         elif self.action.lower() == 'delete':
 
             securable_type = 'catalog'
@@ -310,8 +342,6 @@ class AccessManagement():
             api_version = '/api/2.1'
             api_command = f'/unity-catalog/permissions/{securable_type}/{catalog_name}'
             url = f"{self.server_hostname}{api_version}{api_command}"
-            headers = {'Authorization': 'Bearer %s' % self.token}
-            session = requests.Session()
             payload = {
             "changes": [
                 {
@@ -320,18 +350,16 @@ class AccessManagement():
                     "USE_CATALOG"
                 ]}]}
 
-            resp = session.request('PATCH', url, data=json.dumps(payload), verify = True, headers=headers) 
+            resp = self.send_request('PATCH', url, payload) 
             assert resp.status_code == 200, f"Removing USE CATALOG permission on {catalog_name} to Application ID {self.app_id} has failed. Reason: {resp.json()}"
             self.logger.info(f"Removing USE CATALOG permission on {catalog_name} to Application ID {self.app_id} has succeeded")
 
             schema_list = ['system.access', 'system.billing', 'system.information_schema', 'system.lakeflow']
             securable_type = 'schema'
 
-            for schema_name in schema_list:
+            def remove_schema(schema_name: str) -> None:
                 api_command = f'/unity-catalog/permissions/{securable_type}/{schema_name}'
                 url = f"{self.server_hostname}{api_version}{api_command}"
-                headers = {'Authorization': 'Bearer %s' % self.token}
-                session = requests.Session()
                 payload = {
                 "changes": [
                     {
@@ -340,21 +368,19 @@ class AccessManagement():
                         "USE_SCHEMA"
                     ]}]}
 
-                resp = session.request('PATCH', url, data=json.dumps(payload), verify = True, headers=headers) 
+                resp = self.send_request('PATCH', url, payload) 
                 assert resp.status_code == 200, f"Removing USE SCHEMA permission on {schema_name} to Application ID {self.app_id} has failed. Reason: {resp.json()}"
                 self.logger.info(f"Removing USE SCHEMA permission on {schema_name} to Application ID {self.app_id} has succeeded")
 
+            self.run_concurrently(remove_schema, schema_list)
 
             tables_list = ['system.access.audit', 'system.billing.list_prices', 'system.billing.usage', 'system.information_schema.table_privileges', 'system.information_schema.schema_privileges', 'system.information_schema.catalog_privileges', 'system.information_schema.volume_privileges', 'system.information_schema.catalogs', 'system.information_schema.catalog_tags', 'system.information_schema.schemata', 'system.information_schema.schema_tags', 'system.information_schema.tables', 'system.information_schema.table_tags', 'system.lakeflow.jobs']
             securable_type = 'table'
 
-            for table_name in tables_list:
-
+            def remove_table(table_name: str) -> None:
                 api_version = '/api/2.1'
                 api_command = f'/unity-catalog/permissions/{securable_type}/{table_name}'
                 url = f"{self.server_hostname}{api_version}{api_command}"
-                headers = {'Authorization': 'Bearer %s' % self.token}
-                session = requests.Session()
                 payload = {
             "changes": [
                 {
@@ -363,10 +389,12 @@ class AccessManagement():
                     "SELECT"
                 ]}]}
 
-                resp = session.request('PATCH', url, data=json.dumps(payload), verify = True, headers=headers) 
+                resp = self.send_request('PATCH', url, payload) 
                 assert resp.status_code == 200, f"Removing SELECT permission on {table_name} to Application ID {self.app_id} has failed. Reason: {resp.json()}"
                 self.logger.info(f"Removing USE SELECT permission on {table_name} to Application ID {self.app_id} has succeeded")
 
+            self.run_concurrently(remove_table, tables_list)
+
         else:
             self.logger.warning(f"Wrong action input parameter. It can be 'create' or 'delete' and you used {self.action}")
 
@@ -396,8 +424,6 @@ class AccessManagement():
             api_version = '/api/2.1'
             api_command = f'/unity-catalog/permissions/{securable_type}/{self.catalog_name}'
             url = f"{self.server_hostname}{api_version}{api_command}"
-            headers = {'Authorization': 'Bearer %s' % self.token}
-            session = requests.Session()
             payload = {
             "changes": [
                 {
@@ -406,7 +432,7 @@ class AccessManagement():
                     "ALL_PRIVILEGES"
                 ]}]}
 
-            resp = session.request('PATCH', url, data=json.dumps(payload), verify = True, headers=headers) 
+            resp = self.send_request('PATCH', url, payload) 
             assert resp.status_code == 200, f"Granting ALL PRIVILEGES permission on {self.catalog_name} to Application ID {self.app_id} has failed. Reason: {resp.json()}"
             self.logger.info(f"Granting ALL PRIVILEGES permission on {self.catalog_name} to Application ID {self.app_id} has succeeded")
 
@@ -416,8 +442,6 @@ class AccessManagement():
             api_version = '/api/2.1'
             api_command = f'/unity-catalog/permissions/{securable_type}/{self.catalog_name}'
             url = f"{self.server_hostname}{api_version}{api_command}"
-            headers = {'Authorization': 'Bearer %s' % self.token}
-            session = requests.Session()
             payload = {
             "changes": [
                 {
@@ -426,7 +450,7 @@ class AccessManagement():
                     "ALL_PRIVILEGES"
                 ]}]}
 
-            resp = session.request('PATCH', url, data=json.dumps(payload), verify = True, headers=headers) 
+            resp = self.send_request('PATCH', url, payload) 
             assert resp.status_code == 200, f"Removing ALL PRIVILEGES permission on {self.catalog_name} to Application ID {self.app_id} has failed. Reason: {resp.json()}"
             self.logger.info(f"Removing ALL PRIVILEGES permission on {self.catalog_name} to Application ID {self.app_id} has succeeded")
 
@@ -458,15 +482,13 @@ class AccessManagement():
             api_version = '/api/2.0'
             api_command = '/secrets/acls/put'
             url = f"{self.server_hostname}{api_version}{api_command}"
-            headers = {'Authorization': 'Bearer %s' % self.token}
-            session = requests.Session()
             payload = {
                         "scope": self.scope_name,
                         "principal": self.app_id,
                         "permission": "READ"
                         }
 
-            resp = session.request('POST', url, data=json.dumps(payload), verify = True, headers=headers) 
+            resp = self.send_request('POST', url, payload) 
             assert resp.status_code == 200, f"Granting READ permission on scope {self.scope_name} to Application ID {self.app_id} has failed. Reason: {resp.json()}"
             self.logger.info(f"Granting READ permission on scope {self.scope_name} to Application ID {self.app_id} has succeeded")
 
@@ -475,14 +497,12 @@ class AccessManagement():
             api_version = '/api/2.0'
             api_command = '/secrets/acls/delete'
             url = f"{self.server_hostname}{api_version}{api_command}"
-            headers = {'Authorization': 'Bearer %s' % self.token}
-            session = requests.Session()
             payload = {
                     "scope": self.scope_name,
                     "principal": self.app_id
                         }
 
-            resp = session.request('POST', url, data=json.dumps(payload), verify = True, headers=headers) 
+            resp = self.send_request('POST', url, payload) 
             assert resp.status_code == 200, f"Removing READ permission on scope {self.scope_name} to Application ID {self.app_id} has failed. Reason: {resp.json()}"
             self.logger.info(f"Removing READ permission on scope {self.scope_name} to Application ID {self.app_id} has succeeded")
 
@@ -0,0 +1,140 @@
+import time
+import threading
+from modules.logger import activate_logger
+
+class ConcurrencyLimiter():
+    ### One limiter per host, shared by every instance calling the same host
+    host_limiters = {}
+    host_limiters_lock = threading.Lock()
+
+    def __init__(self, initial_limit: int = 4, min_limit: int = 1, max_limit: int = 64, backoff_ratio: float = 0.5, latency_tolerance: float = 2.0, max_retries: int = 3, logger: str = ''):
+        '''
+        Adaptive (AIMD) concurrency limiter for HTTP calls. The in-flight limit is raised additively while latency stays flat and
+        it's cut multiplicatively when the server responds with 429 / 503 or when latency starts rising. Workspaces behave
+        differently, so use one limiter per host, e.g. with ConcurrencyLimiter.for_host(server_hostname).
+
+        initial_limit: int
+        Amount of concurrent calls allowed at start.
+
+        min_limit / max_limit: int
+        Lower and upper bounds for the in-flight limit.
+
+        backoff_ratio: float
+        Multiplier used for the limit when the calls are throttled.
+
+        latency_tolerance: float
+        How many times slower than the endpoint's latency baseline the smoothed latency can be before the limit is decreased.
+        Baselines are tracked per endpoint and they decay towards recent latencies, so one fast outlier can't pin them.
+
+        max_retries: int
+        How many times a throttled call is retried before the response is returned to the caller.
+        '''
+        assert 1 <= min_limit <= initial_limit <= max_limit, f"Limits must satisfy 1 <= min_limit <= initial_limit <= max_limit and you used {min_limit}, {initial_limit}, {max_limit}"
+        assert 0 < backoff_ratio < 1, f"'backoff_ratio' must be between 0 and 1 and you used {backoff_ratio}"
+
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        self.max_retries = max_retries
+        self.throttle_status_codes = [429, 503]
+
+        self.in_flight = 0
+        self.baseline_latency = {}
+        self.smoothed_latency = {}
+        self.samples_since_cut = 0
+        self.condition = threading.Condition()
+
+        ### Activating logger if it's not passed as a parameter
+        if logger != '':
+            self.logger = logger
+        else:
+            self.logger = activate_logger()
+
+    @classmethod
+    def for_host(cls, hostname: str, logger: str = '') -> 'ConcurrencyLimiter':
+        '''
+        Returns the limiter of the chosen host and creates it on the first call.
+        '''
+        with cls.host_limiters_lock:
+            if hostname not in cls.host_limiters:
+                cls.host_limiters[hostname] = cls(logger = logger)
+            return cls.host_limiters[hostname]
+
+    @property
+    def current_limit(self) -> int:
+        '''
+        Current in-flight limit as an integer.
+        '''
+        return int(self.limit)
+
+    def acquire(self) -> None:
+        '''
+        Blocks until there is room for a new in-flight call.
+        '''
+        with self.condition:
+            while self.in_flight >= self.current_limit:
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency: float, status_code: int, key: str = '') -> None:
+        '''
+        Releases the in-flight slot and adjusts the limit based on the observed latency and status code.
+        Latency is compared only against the baseline of the same endpoint (key).
+        '''
+        with self.condition:
+            saturated = self.in_flight >= self.current_limit
+            self.in_flight -= 1
+            self.samples_since_cut += 1
+            previous_limit = self.current_limit
+
+            if status_code in self.throttle_status_codes or status_code is None:
+                self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+                self.samples_since_cut = 0
+                reason = f"throttled with status code {status_code}" if status_code else "call failed without a response"
+            else:
+                ### Baseline follows faster latencies immediately and slower ones slowly, so one fast outlier can't pin it
+                baseline = self.baseline_latency.get(key, latency)
+                baseline = latency if latency < baseline else baseline + 0.05 * (latency - baseline)
+                self.baseline_latency[key] = baseline
+                smoothed = 0.8 * self.smoothed_latency.get(key, latency) + 0.2 * latency
+                self.smoothed_latency[key] = smoothed
+
+                ### Cutting the limit at most once per window of in-flight calls
+                if smoothed > baseline * self.latency_tolerance and self.samples_since_cut >= self.current_limit:
+                    self.limit = max(self.min_limit, self.limit * 0.9)
+                    self.samples_since_cut = 0
+                    reason = f"latency rose to {smoothed:.3f}s on {key}" if key else f"latency rose to {smoothed:.3f}s"
+                elif saturated and smoothed <= baseline * self.latency_tolerance:
+                    self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                    reason = "latency is flat"
+                else:
+                    reason = ""
+
+            if self.current_limit != previous_limit:
+                self.logger.info(f"Concurrency limit changed from {previous_limit} to {self.current_limit} ({reason})")
+            self.condition.notify_all()
+
+    def call(self, function, *args, key: str = '', **kwargs):
+        '''
+        Calls the function (e.g. requests.Session.request) inside the limiter. Throttled responses are retried after backing off,
+        respecting the 'Retry-After' header when it's available. 'key' identifies the endpoint for latency tracking.
+        '''
+        for attempt in range(self.max_retries + 1):
+            self.acquire()
+            start = time.monotonic()
+            status_code = None
+            try:
+                resp = function(*args, **kwargs)
+                status_code = resp.status_code
+            finally:
+                self.release(time.monotonic() - start, status_code, key)
+
+            if status_code not in self.throttle_status_codes or attempt == self.max_retries:
+                return resp
+
+            retry_after = resp.headers.get('Retry-After', '')
+            wait_time = float(retry_after) if retry_after.replace('.', '', 1).isdigit() else 2 ** attempt
+            self.logger.warning(f"Call was throttled with status code {status_code}. Retrying in {wait_time} seconds.")
+            time.sleep(wait_time)
@@ -0,0 +1,145 @@
+import json
+from modules.logger import activate_logger
+from modules.concurrency import ConcurrencyLimiter
+from modules.transport import Transport, RequestsTransport
+from urllib.parse import urlparse
+
+class GroupManagement():
+    def __init__(self, server_hostname: str, token: str, action: str, logger: str = '', limiter: ConcurrencyLimiter = None, transport: Transport = None):
+        '''
+        Lightweight helper for managing group memberships of many Service Principals at once. Only the workspace and token are needed.
+        '''
+        self.server_hostname = server_hostname
+        self.token = token
+        self.action = action
+
+        ### Activating logger if it's not passed as a parameter
+        if logger != '':
+            self.logger = logger
+        else:
+            self.logger = activate_logger()
+
+        ### Activating concurrency limiter if it's not passed as a parameter. Every workspace gets its own limiter, shared by the instances calling it.
+        if limiter is not None:
+            self.limiter = limiter
+        else:
+            self.limiter = ConcurrencyLimiter.for_host(self.server_hostname, logger = self.logger)
+
+        ### Using requests over HTTP/1.1 if transport isn't passed as a parameter
+        if transport is not None:
+            self.transport = transport
+        else:
+            self.transport = RequestsTransport()
+
+        self.validate_action()
+
+    def validate_action(self) -> None:
+        '''
+        Validates 'action' input parameter. It can be 'create' or 'delete' only.
+        '''
+        if not isinstance(self.action, str) or self.action.lower() not in ['create', 'delete']:
+            raise ValueError(f"Invalid action: {self.action}. Allowed values are 'create' or 'delete'.")
+
+    def send_request(self, method: str, url: str, payload: dict = None):
+        '''
+        All HTTP calls are sent through the adaptive concurrency limiter.
+        '''
+        headers = {'Authorization': 'Bearer %s' % self.token}
+        data = json.dumps(payload) if payload is not None else None
+        ### Latency is tracked per endpoint, e.g. 'PATCH /api/2.0/preview/scim/v2/Groups'
+        key = f"{method} {urlparse(url).path.rsplit('/', 1)[0]}"
+        return self.limiter.call(self.transport.request, method, url, data=data, headers=headers, key=key)
+
+    def fetching_all_resources(self, api_command: str, page_size: int = 100) -> list:
+        '''
+        The function pages through a SCIM list endpoint with 'startIndex' and 'count' until 'totalResults' resources have been fetched.
+        '''
+        api_version = '/api/2.0'
+        resources = []
+        start_index = 1
+
+        while True:
+            url = f"{self.server_hostname}{api_version}{api_command}?startIndex={start_index}&count={page_size}"
+            resp = self.send_request('GET', url) 
+            assert resp.status_code == 200, f"Fetching {api_command} has failed. Reason: {resp.status_code} {resp.text}"
+            page = resp.json().get('Resources', [])
+            resources.extend(page)
+            total_results = resp.json().get('totalResults', len(resources))
+
+            if len(page) == 0 or len(resources) >= total_results:
+                return resources
+            start_index += len(page)
+
+    def fetching_group_ids(self, group_names: list) -> dict:
+        '''
+        The function fetches group IDs for the chosen group display names. Returns a dictionary where key is the group display name and value is the group ID.
+        '''
+        groups = self.fetching_all_resources('/preview/scim/v2/Groups')
+        group_ids = {group.get('displayName'): group.get('id') for group in groups if group.get('displayName') in group_names}
+        for group_name in group_names:
+            if group_name not in group_ids:
+                raise Exception(f"Group '{group_name}' not found")  
+        return group_ids
+
+    def fetching_service_principal_ids(self, app_ids: list) -> dict:
+        '''
+        The function fetches workspace level Service Principal IDs for the chosen Application IDs. Returns a dictionary where key is the Application ID and value is the Service Principal ID.
+        '''
+        sps = self.fetching_all_resources('/preview/scim/v2/ServicePrincipals')
+        sp_ids = {sp.get('applicationId'): sp.get('id') for sp in sps if sp.get('applicationId') in app_ids}
+        for app_id in app_ids:
+            if app_id not in sp_ids:
+                raise Exception(f"Service Principal with Application ID {app_id} not found")
+        return sp_ids
+
+    def group_membership_management(self, app_ids: list, group_names: list = None, chunk_size: int = 100) -> None:
+        '''
+        Input parameters:
+        app_ids: list
+        Application IDs of the Service Principals which will be added to or removed from the groups. 
+
+        group_names: list
+        Display names of the groups. Default is the "admins" group.
+
+        chunk_size: int
+        Maximum amount of members handled in one SCIM PATCH call. 
+
+        action: str
+        It can be "create" or "delete". "create" adds the members and "delete" removes them.
+        '''
+
+        if not isinstance(chunk_size, int) or chunk_size <= 0:
+            raise ValueError(f"'chunk_size' must be a positive integer and you used {chunk_size}")
+        if group_names is None:
+            group_names = ['admins']
+
+        ### Resolving group and Service Principal IDs only once
+        group_ids = self.fetching_group_ids(group_names)
+        sp_ids = [sp_id for sp_id in self.fetching_service_principal_ids(app_ids).values()]
+
+        api_version = '/api/2.0'
+
+        for group_name, group_id in group_ids.items():
+            api_command = f'/preview/scim/v2/Groups/{group_id}'
+            url = f"{self.server_hostname}{api_version}{api_command}"
+
+            for i in range(0, len(sp_ids), chunk_size):
+                chunk = sp_ids[i:i + chunk_size]
+
+                ### Adding members can be done with one operation, removing requires one operation per member
+                if self.action.lower() == 'create':
+                    operations = [{'op': 'add', 
+                                   'path': 'members',
+                                   'value': [{'value': sp_id} for sp_id in chunk]}]
+                    verb, preposition = 'Adding', 'to'
+                else:
+                    operations = [{'op': 'remove', 
+                                   'path': f'members[value eq "{sp_id}"]'} for sp_id in chunk]
+                    verb, preposition = 'Removing', 'from'
+
+                payload = {'schemas': ['urn:ietf:params:scim:api:messages:2.0:PatchOp'],
+                           'Operations': operations}
+
+                resp = self.send_request('PATCH', url, payload) 
+                assert resp.status_code in [200, 204], f"{verb} {len(chunk)} Service Principals {preposition} group {group_name} has failed. Reason: {resp.status_code} {resp.text}"
+                self.logger.info(f"{verb} {len(chunk)} Service Principals {preposition} group {group_name} has succeeded.")
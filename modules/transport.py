@@ -0,0 +1,92 @@
+import requests
+from abc import ABC, abstractmethod
+from requests.adapters import HTTPAdapter
+
+### httpx is needed only for HTTP/2 transport
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+class TransportError(Exception):
+    '''
+    Raised by every transport when the call fails without a response, e.g. when the connection can't be opened.
+    '''
+
+
+class TransportTimeout(TransportError):
+    '''
+    Raised by every transport when the connect or read timeout is exceeded.
+    '''
+
+
+class Transport(ABC):
+    '''
+    Base class for the HTTP layer used by AccessManagement, AccountManagement and UnitTest. Implementations must return
+    a response object with 'status_code', 'headers', 'text' and 'json()'. The same transport can be shared between
+    instances, so many concurrent calls can reuse the same connections.
+    Implementations must raise TransportTimeout on timeouts and TransportError on other failures without a response,
+    so callers can handle errors the same way with every transport. The original exception is chained as __cause__.
+    '''
+    def __init__(self, connect_timeout: float = 10, read_timeout: float = 60, verify: bool = True):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.verify = verify
+        ### Large SCIM and list responses are compressed by the server
+        self.default_headers = {'Accept-Encoding': 'gzip'}
+
+    @abstractmethod
+    def request(self, method: str, url: str, data: str = None, headers: dict = None):
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class RequestsTransport(Transport):
+    '''
+    HTTP/1.1 transport using requests with connection pooling, gzip responses and strict connect and read timeouts.
+    'pool_maxsize' should match the expected concurrency (ConcurrencyLimiter max_limit), otherwise extra connections are discarded.
+    '''
+    def __init__(self, connect_timeout: float = 10, read_timeout: float = 60, verify: bool = True, pool_maxsize: int = 64):
+        super().__init__(connect_timeout, read_timeout, verify)
+        self.session = requests.Session()
+        self.session.headers.update(self.default_headers)
+        adapter = HTTPAdapter(pool_connections = 10, pool_maxsize = pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method: str, url: str, data: str = None, headers: dict = None) -> requests.Response:
+        try:
+            return self.session.request(method, url, data=data, headers=headers, verify = self.verify, timeout=(self.connect_timeout, self.read_timeout))
+        except requests.exceptions.Timeout as e:
+            raise TransportTimeout(f"{method} {url} timed out: {e}") from e
+        except requests.exceptions.RequestException as e:
+            raise TransportError(f"{method} {url} failed: {e}") from e
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class Http2Transport(Transport):
+    '''
+    HTTP/2 transport using httpx. Concurrent calls to the same workspace are multiplexed over one connection.
+    Requires httpx with HTTP/2 support: pip install 'httpx[http2]'
+    '''
+    def __init__(self, connect_timeout: float = 10, read_timeout: float = 60, verify: bool = True):
+        if httpx is None:
+            raise ImportError("HTTP/2 transport requires httpx. Please install it with: pip install 'httpx[http2]'")
+        super().__init__(connect_timeout, read_timeout, verify)
+        timeout = httpx.Timeout(read_timeout, connect = connect_timeout)
+        self.client = httpx.Client(http2 = True, timeout = timeout, verify = verify, headers = self.default_headers)
+
+    def request(self, method: str, url: str, data: str = None, headers: dict = None) -> 'httpx.Response':
+        try:
+            return self.client.request(method, url, content=data, headers=headers)
+        except httpx.TimeoutException as e:
+            raise TransportTimeout(f"{method} {url} timed out: {e}") from e
+        except httpx.HTTPError as e:
+            raise TransportError(f"{method} {url} failed: {e}") from e
+
+    def close(self) -> None:
+        self.client.close()
@@ -2,11 +2,12 @@ import pandas as pd
 import re
 from modules.logger import activate_logger
 import logging
-import requests
+from modules.transport import Transport, RequestsTransport
+from modules.concurrency import ConcurrencyLimiter
 import pandas as pd
 
 class UnitTest():
-    def __init__(self, app_id: str, display_name: str, catalog_name: str, scope_name: str, server_hostname: str, token: str, sp_type: str, action: str, cloud_provider: str, logger: str = ''):
+    def __init__(self, app_id: str, display_name: str, catalog_name: str, scope_name: str, server_hostname: str, token: str, sp_type: str, action: str, cloud_provider: str, logger: str = '', provisioning: str = 'workspace', transport: Transport = None, limiter: ConcurrencyLimiter = None):
         self.app_id = app_id
         self.display_name = display_name
         self.catalog_name = catalog_name
@@ -16,6 +17,7 @@ class UnitTest():
         self.sp_type = sp_type
         self.action = action
         self.cloud_provider = cloud_provider
+        self.provisioning = provisioning
         
         ### Activating logger if it's not passed as a parameter
         if logger != '':
@@ -23,6 +25,18 @@ class UnitTest():
         else:
             self.logger = activate_logger() 
 
+        ### Using requests over HTTP/1.1 if transport isn't passed as a parameter
+        if transport is not None:
+            self.transport = transport
+        else:
+            self.transport = RequestsTransport()
+
+        ### Activating concurrency limiter if it's not passed as a parameter. Every workspace gets its own limiter.
+        if limiter is not None:
+            self.limiter = limiter
+        else:
+            self.limiter = ConcurrencyLimiter.for_host(self.server_hostname, logger = self.logger)
+
     def validate_inputs(self) -> None:  
         '''  
         Validates the input parameters to ensure each one is a non-empty string.   
@@ -38,6 +52,18 @@ class UnitTest():
         
         self.logger.info(f"Validate inputs unit test has been passed")
 
+    def validate_provisioning(self) -> None:  
+        '''  
+        Validates 'provisioning' input parameter. It can be 'workspace' or 'account' only. Account level provisioning requires app_id, because the Service Principal has been created already.
+        '''  
+        valid_provisionings = ['workspace', 'account']  
+        if self.provisioning not in valid_provisionings:  
+            raise ValueError(f"Invalid provisioning: {self.provisioning}. Allowed values are 'workspace' or 'account'.")  
+        elif self.provisioning == 'account' and (self.app_id is None or self.app_id == ''):
+            raise ValueError("app_id is required when account level provisioning is used.")
+
+        self.logger.info(f"Validate 'provisioning' input parameter unit test has been passed")
+
     def validate_sp_type(self) -> None:  
         '''  
         Validates 'sp_type' input parameter. It can be 'create' or 'delete' only.
@@ -132,8 +158,7 @@ class UnitTest():
         url = f"{self.server_hostname}{api_version}{api_command}"
         headers = {'Authorization': 'Bearer %s' % self.token}
 
-        session = requests.Session()
-        resp = session.request('GET', url, verify = True, headers=headers) 
+        resp = self.limiter.call(self.transport.request, 'GET', url, headers=headers, key=f"GET {api_version}/preview/scim/v2") 
 
         ### Checking if there are any service principals
         if resp.json()['itemsPerPage'] == 0:
@@ -0,0 +1,212 @@
+import json
+import time
+import logging
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from modules import AccessManagement, AccountManagement
+from modules.concurrency import ConcurrencyLimiter
+from modules.transport import RequestsTransport
+
+ACCOUNT_ID = 'account-1'
+WORKSPACE_HOSTNAME = 'https://adb-123456789.1.azuredatabricks.net'
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    '''
+    Local stand-in for the account level SCIM and workspace assignment APIs and for the workspace APIs used by the grants.
+    '''
+    def log_message(self, *args):
+        pass
+
+    def send(self, status_code: int, body: dict = None) -> None:
+        data = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def handle_request(self) -> None:
+        server = self.server
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = json.loads(self.rfile.read(length) or b'null')
+        parsed = urlparse(self.path)
+        path = parsed.path
+        with server.lock:
+            server.calls.append((self.command, path, parsed.query, payload))
+
+        account_scim = f'/api/2.0/accounts/{ACCOUNT_ID}/scim/v2/ServicePrincipals'
+        if path == account_scim and self.command == 'POST':
+            with server.lock:
+                ### Like Databricks, duplicate display names are allowed and only a reused applicationId conflicts
+                if any(sp['applicationId'] == payload.get('applicationId') for sp in server.service_principals.values()):
+                    return self.send(409, {'detail': 'Service Principal already exists'})
+                server.created += 1
+                sp = {'id': f'sp-{server.created}', 'applicationId': payload.get('applicationId', f'app-{server.created}'), 'displayName': payload['displayName']}
+                server.service_principals[sp['id']] = sp
+            return self.send(201, sp)
+        if path == account_scim and self.command == 'GET':
+            attribute, _, value = parse_qs(parsed.query)['filter'][0].partition(' eq ')
+            return self.send(200, {'Resources': [sp for sp in server.service_principals.values() if sp[attribute] == value.strip('"')]})
+        if path.startswith(f'{account_scim}/') and self.command == 'DELETE':
+            server.service_principals.pop(path.rsplit('/', 1)[1])
+            return self.send(204)
+        if '/permissionassignments/principals/' in path:
+            with server.lock:
+                server.in_flight += 1
+                server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            time.sleep(0.05)
+            with server.lock:
+                server.in_flight -= 1
+            return self.send(200, {})
+
+        ### Workspace level APIs
+        if path == '/api/2.0/preview/scim/v2/ServicePrincipals':
+            return self.send(200, {'itemsPerPage': len(server.service_principals), 'Resources': list(server.service_principals.values())})
+        if path == '/api/2.0/workspace/list':
+            return self.send(200, {'objects': [{'path': '/Workspace/Ikidata', 'object_id': 42}]})
+        return self.send(200, {})
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = handle_request
+
+
+class StandInTransport(RequestsTransport):
+    '''
+    Sends every call to the local stand-in server regardless of the hostname.
+    '''
+    def __init__(self, stand_in_url: str):
+        super().__init__(connect_timeout = 5, read_timeout = 5)
+        self.stand_in_url = stand_in_url
+
+    def request(self, method: str, url: str, data: str = None, headers: dict = None):
+        parsed = urlparse(url)
+        path = parsed.path + (f'?{parsed.query}' if parsed.query else '')
+        return super().request(method, f"{self.stand_in_url}{path}", data=data, headers=headers)
+
+
+class AccountManagementTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        self.server.lock = threading.Lock()
+        self.server.calls = []
+        self.server.service_principals = {}
+        self.server.created = 0
+        self.server.in_flight = 0
+        self.server.max_in_flight = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.transport = StandInTransport(f"http://127.0.0.1:{self.server.server_address[1]}")
+        self.logger = logging.getLogger('test_account')
+
+    def account(self, action: str, app_id: str = '', permission: str = 'ADMIN') -> AccountManagement:
+        return AccountManagement('ikidata_sp', 'https://accounts.azuredatabricks.net', ACCOUNT_ID, 'token', ['111', '222', '333', '444'],
+                                 action, app_id=app_id, permission=permission, logger=self.logger,
+                                 limiter=ConcurrencyLimiter(logger = self.logger), transport=self.transport)
+
+    def calls(self, method: str, marker: str) -> list:
+        return [call for call in self.server.calls if call[0] == method and marker in call[1]]
+
+    def test_create_and_assign_concurrently(self):
+        account = self.account('Create')
+        account.service_principal_management()
+        account.workspace_assignment_management()
+
+        self.assertEqual(account.app_id, 'app-1')
+        assignments = self.calls('PUT', '/permissionassignments/principals/sp-1')
+        self.assertEqual(sorted(call[1].split('/')[6] for call in assignments), ['111', '222', '333', '444'])
+        self.assertTrue(all(call[3] == {'permissions': ['ADMIN']} for call in assignments))
+        self.assertGreater(self.server.max_in_flight, 1)
+
+    def filters(self) -> list:
+        return [parse_qs(call[2])['filter'][0] for call in self.calls('GET', f'/accounts/{ACCOUNT_ID}/scim/v2/ServicePrincipals')]
+
+    def test_create_existing_service_principal_is_looked_up_by_filter(self):
+        self.account('create').service_principal_management()
+        self.server.calls.clear()
+        account = self.account('create', app_id='app-1')
+        account.service_principal_management()
+
+        ### 409 is returned for the reused applicationId
+        self.assertEqual(account.sp_id, 'sp-1')
+        self.assertEqual(self.filters(), ['applicationId eq "app-1"'])
+
+    def test_rerunning_create_without_app_id_reuses_service_principal(self):
+        first = self.account('create')
+        first.service_principal_management()
+        second = self.account('create')
+        second.service_principal_management()
+
+        self.assertEqual(len(self.calls('POST', f'/accounts/{ACCOUNT_ID}/scim/v2/ServicePrincipals')), 1)
+        self.assertEqual(len(self.server.service_principals), 1)
+        self.assertEqual((second.app_id, second.sp_id), (first.app_id, first.sp_id))
+        self.assertEqual(self.filters(), ['displayName eq "ikidata_sp"', 'displayName eq "ikidata_sp"'])
+
+    def test_create_without_app_id_fails_on_duplicate_display_names(self):
+        for app_id in ['app-a', 'app-b']:
+            self.account('create', app_id=app_id).service_principal_management()
+
+        with self.assertRaises(Exception):
+            self.account('create').service_principal_management()
+        self.assertEqual(len(self.server.service_principals), 2)
+
+    def test_delete(self):
+        self.account('create').service_principal_management()
+        account = self.account('delete', app_id='app-1')
+        account.workspace_assignment_management()
+        account.service_principal_management()
+
+        self.assertEqual(len(self.calls('DELETE', '/permissionassignments/principals/sp-1')), 4)
+        self.assertEqual(len(self.calls('DELETE', f'/accounts/{ACCOUNT_ID}/scim/v2/ServicePrincipals/sp-1')), 1)
+        self.assertEqual(self.server.service_principals, {})
+
+    def test_invalid_inputs(self):
+        with self.assertRaises(ValueError):
+            self.account('update')
+        with self.assertRaises(ValueError):
+            self.account('create', permission='OWNER')
+        self.assertEqual(self.account('create', permission='user').permission, 'USER')
+        with self.assertRaises(ValueError):
+            AccountManagement('ikidata_sp', 'https://accounts.azuredatabricks.net', '', 'token', ['111'], 'create', logger=self.logger, transport=self.transport)
+        with self.assertRaises(ValueError):
+            AccountManagement('', 'https://accounts.azuredatabricks.net', ACCOUNT_ID, 'token', ['111'], 'create', logger=self.logger, transport=self.transport)
+        with self.assertRaises(ValueError):
+            AccountManagement('ikidata_sp', 'https://accounts.azuredatabricks.net', ACCOUNT_ID, None, ['111'], 'create', logger=self.logger, transport=self.transport)
+        with self.assertRaises(ValueError):
+            AccountManagement('ikidata_sp', 'https://accounts.azuredatabricks.net', ACCOUNT_ID, 'token', ['111', None], 'create', logger=self.logger, transport=self.transport)
+        with self.assertRaises(ValueError):
+            AccountManagement('ikidata_sp', 'https://accounts.azuredatabricks.net', ACCOUNT_ID, 'token', ['111', ''], 'create', logger=self.logger, transport=self.transport)
+
+    def test_access_management_reuses_app_id(self):
+        account = self.account('create')
+        account.service_principal_management()
+        account.workspace_assignment_management()
+        self.server.calls.clear()
+
+        main = AccessManagement('ikidata_sp', 'ikidata_catalog', 'kv-customer', WORKSPACE_HOSTNAME, 'token', 'databricks', 'create', 'azure',
+                                app_id=account.app_id, logger=self.logger, limiter=ConcurrencyLimiter(logger = self.logger),
+                                transport=self.transport, provisioning='account')
+        main.service_principal_management()
+        main.workspace_management()
+        main.table_management()
+        main.catalog_management()
+        main.key_vault_management()
+
+        ### No workspace level Service Principal is created, entitlements are granted to the assigned one
+        self.assertEqual(self.calls('POST', '/preview/scim/v2/ServicePrincipals'), [])
+        entitlements = self.calls('PATCH', '/preview/scim/v2/ServicePrincipals/sp-1')
+        self.assertEqual(len(entitlements), 1)
+        self.assertEqual([value['value'] for value in entitlements[0][3]['Operations'][0]['value']], ['workspace-access', 'databricks-sql-access', 'allow-cluster-create'])
+
+        grants = self.calls('PATCH', '/unity-catalog/permissions/')
+        self.assertEqual(len(grants), 1 + 5 + 15 + 1)
+        self.assertTrue(all(call[3]['changes'][0]['principal'] == 'app-1' for call in grants))
+        self.assertEqual(self.calls('POST', '/secrets/acls/put')[0][3]['principal'], 'app-1')
+        self.assertEqual(self.calls('PUT', '/permissions/directories/42')[0][3]['access_control_list'][0]['service_principal_name'], 'app-1')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import time
+import logging
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from modules import AccessManagement
+from modules.concurrency import ConcurrencyLimiter
+from modules.transport import Transport
+
+
+class FakeResponse():
+    def __init__(self, status_code: int = 200, headers: dict = None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeWorkspaceResponse(FakeResponse):
+    def __init__(self, body: dict):
+        super().__init__(200)
+        self.body = body
+        self.text = str(body)
+
+    def json(self) -> dict:
+        return self.body
+
+
+class FakeWorkspaceTransport(Transport):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def request(self, method: str, url: str, data: str = None, headers: dict = None) -> FakeWorkspaceResponse:
+        self.calls += 1
+        return FakeWorkspaceResponse({'itemsPerPage': 1, 'Resources': [{'applicationId': 'app-1', 'id': 'sp-1', 'displayName': 'ikidata_sp'}]})
+
+
+class CountingLimiter(ConcurrencyLimiter):
+    def __init__(self, logger: str = ''):
+        super().__init__(logger = logger)
+        self.calls = 0
+
+    def call(self, function, *args, key: str = '', **kwargs):
+        self.calls += 1
+        return super().call(function, *args, key=key, **kwargs)
+
+
+class ConcurrencyLimiterTest(unittest.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger('test_concurrency')
+
+    def call_many(self, limiter: ConcurrencyLimiter, amount: int, latency: float, key: str, status_code: int = 200) -> None:
+        def slow_call():
+            time.sleep(latency)
+            return FakeResponse(status_code)
+
+        with ThreadPoolExecutor(max_workers = limiter.max_limit) as executor:
+            for future in [executor.submit(limiter.call, slow_call, key=key) for _ in range(amount)]:
+                future.result()
+
+    def test_limit_rises_while_latency_is_flat_after_fast_call_on_other_endpoint(self):
+        limiter = ConcurrencyLimiter(initial_limit = 4, max_limit = 16, logger = self.logger)
+        self.call_many(limiter, 1, 0.005, 'GET /api/2.0/preview/scim/v2')
+        self.call_many(limiter, 200, 0.025, 'PATCH /api/2.1/unity-catalog/permissions/table')
+        self.assertGreater(limiter.current_limit, 4)
+
+    def test_fast_outlier_on_same_endpoint_does_not_pin_the_limit(self):
+        limiter = ConcurrencyLimiter(initial_limit = 4, max_limit = 16, logger = self.logger)
+        self.call_many(limiter, 1, 0.001, 'PATCH /api/2.1/unity-catalog/permissions/table')
+        self.call_many(limiter, 300, 0.025, 'PATCH /api/2.1/unity-catalog/permissions/table')
+        self.assertGreater(limiter.current_limit, 4)
+
+    def test_throttling_cuts_the_limit(self):
+        limiter = ConcurrencyLimiter(initial_limit = 8, max_retries = 0, logger = self.logger)
+        self.call_many(limiter, 1, 0.001, 'GET /api/2.0/preview/scim/v2', status_code = 429)
+        self.assertEqual(limiter.current_limit, 4)
+
+    def test_limiters_are_separate_per_host(self):
+        first = ConcurrencyLimiter.for_host('https://adb-1.azuredatabricks.net', logger = self.logger)
+        second = ConcurrencyLimiter.for_host('https://adb-2.azuredatabricks.net', logger = self.logger)
+        self.assertIs(first, ConcurrencyLimiter.for_host('https://adb-1.azuredatabricks.net'))
+        self.assertIsNot(first, second)
+
+    def test_every_access_management_call_goes_through_the_limiter(self):
+        transport = FakeWorkspaceTransport()
+        limiter = CountingLimiter(logger = self.logger)
+        main = AccessManagement('ikidata_sp', 'ikidata_catalog', 'kv-customer', 'https://adb-123456789.1.azuredatabricks.net', 'token', 'databricks', 'delete', 'azure',
+                                app_id='app-1', logger=self.logger, limiter=limiter, transport=transport)
+        main.catalog_management()
+        main.key_vault_management()
+
+        ### UnitTest's Service Principal check is included
+        self.assertEqual(transport.calls, 3)
+        self.assertEqual(limiter.calls, transport.calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import json
+import logging
+import unittest
+from urllib.parse import urlparse, parse_qs
+from modules.groups import GroupManagement
+from modules.transport import Transport
+
+
+class FakeResponse():
+    def __init__(self, status_code: int, body: dict = None):
+        self.status_code = status_code
+        self.headers = {}
+        self.body = body or {}
+        self.text = json.dumps(self.body)
+
+    def json(self) -> dict:
+        return self.body
+
+
+class FakeTransport(Transport):
+    def __init__(self, amount_of_service_principals: int = 5):
+        super().__init__()
+        self.calls = []
+        self.groups = [{'displayName': 'admins', 'id': 'g1'}, {'displayName': 'ikidata_users', 'id': 'g2'}]
+        self.service_principals = [{'applicationId': f'app-{i}', 'id': f'sp-{i}', 'displayName': f'sp_{i}'} for i in range(amount_of_service_principals)]
+
+    def page(self, resources: list, query: str) -> FakeResponse:
+        params = parse_qs(query)
+        start_index = int(params.get('startIndex', ['1'])[0])
+        count = int(params.get('count', ['100'])[0])
+        return FakeResponse(200, {'totalResults': len(resources), 'startIndex': start_index,
+                                  'Resources': resources[start_index - 1:start_index - 1 + count]})
+
+    def request(self, method: str, url: str, data: str = None, headers: dict = None) -> FakeResponse:
+        self.calls.append((method, url, json.loads(data) if data else None))
+        parsed = urlparse(url)
+        if parsed.path.endswith('/preview/scim/v2/Groups'):
+            return self.page(self.groups, parsed.query)
+        if parsed.path.endswith('/preview/scim/v2/ServicePrincipals'):
+            return self.page(self.service_principals, parsed.query)
+        return FakeResponse(204)
+
+
+class GroupManagementTest(unittest.TestCase):
+    def setUp(self):
+        self.transport = FakeTransport()
+        self.logger = logging.getLogger('test_groups')
+
+    def patches(self) -> list:
+        return [call for call in self.transport.calls if call[0] == 'PATCH']
+
+    def test_adding_members_in_chunks(self):
+        groups = GroupManagement('https://adb-1.azuredatabricks.net', 'token', 'Create', self.logger, transport = self.transport)
+        groups.group_membership_management([f'app-{i}' for i in range(5)], chunk_size = 2)
+
+        ### Group and Service Principal IDs are resolved once
+        self.assertEqual([call[0] for call in self.transport.calls[:2]], ['GET', 'GET'])
+        self.assertEqual(len(self.transport.calls), 5)
+        self.assertTrue(all(urlparse(call[1]).path.endswith('/Groups/g1') for call in self.patches()))
+        self.assertEqual([len(call[2]['Operations'][0]['value']) for call in self.patches()], [2, 2, 1])
+
+    def test_removing_members_from_many_groups(self):
+        groups = GroupManagement('https://adb-1.azuredatabricks.net', 'token', 'delete', self.logger, transport = self.transport)
+        groups.group_membership_management(['app-0', 'app-1'], group_names = ['admins', 'ikidata_users'])
+
+        self.assertEqual(len(self.patches()), 2)
+        self.assertEqual(self.patches()[1][2]['Operations'], [{'op': 'remove', 'path': 'members[value eq "sp-0"]'},
+                                                            {'op': 'remove', 'path': 'members[value eq "sp-1"]'}])
+
+    def test_service_principals_are_resolved_from_every_page(self):
+        self.transport = FakeTransport(amount_of_service_principals = 250)
+        groups = GroupManagement('https://adb-1.azuredatabricks.net', 'token', 'create', self.logger, transport = self.transport)
+        groups.group_membership_management(['app-3', 'app-120', 'app-249'])
+
+        sp_pages = [call for call in self.transport.calls if urlparse(call[1]).path.endswith('/ServicePrincipals')]
+        self.assertEqual([parse_qs(urlparse(call[1]).query)['startIndex'][0] for call in sp_pages], ['1', '101', '201'])
+        self.assertEqual(self.patches()[0][2]['Operations'][0]['value'], [{'value': 'sp-3'}, {'value': 'sp-120'}, {'value': 'sp-249'}])
+
+    def test_invalid_inputs(self):
+        with self.assertRaises(ValueError):
+            GroupManagement('https://adb-1.azuredatabricks.net', 'token', 'update', self.logger, transport = self.transport)
+        groups = GroupManagement('https://adb-1.azuredatabricks.net', 'token', 'create', self.logger, transport = self.transport)
+        with self.assertRaises(ValueError):
+            groups.group_membership_management(['app-0'], chunk_size = 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
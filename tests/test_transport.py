@@ -0,0 +1,166 @@
+import ssl
+import gzip
+import json
+import time
+import socket
+import tempfile
+import threading
+import subprocess
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from modules.transport import Transport, RequestsTransport, Http2Transport, TransportError, TransportTimeout
+
+try:
+    import h2.config
+    import h2.events
+    import h2.connection
+    import httpx
+except ImportError:
+    h2 = None
+
+
+class Http2StandIn():
+    '''
+    Local HTTP/2 stand-in server over TLS. Every response body is gzip compressed when the client accepts it.
+    '''
+    def __init__(self, certfile: str, keyfile: str):
+        self.connections = 0
+        self.streams = 0
+        self.max_open_streams = 0
+        self.lock = threading.Lock()
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.context.load_cert_chain(certfile, keyfile)
+        self.context.set_alpn_protocols(['h2'])
+        self.listener = socket.create_server(('127.0.0.1', 0))
+        self.url = f"https://127.0.0.1:{self.listener.getsockname()[1]}"
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self) -> None:
+        while True:
+            try:
+                sock, _ = self.listener.accept()
+            except OSError:
+                return
+            with self.lock:
+                self.connections += 1
+            threading.Thread(target=self.handle, args=(sock,), daemon=True).start()
+
+    def handle(self, sock: socket.socket) -> None:
+        sock = self.context.wrap_socket(sock, server_side=True)
+        conn = h2.connection.H2Connection(config=h2.config.H2Configuration(client_side=False, header_encoding='utf-8'))
+        conn.initiate_connection()
+        sock.sendall(conn.data_to_send())
+        requests = {}
+        while True:
+            data = sock.recv(65535)
+            if not data:
+                return
+            finished = []
+            for event in conn.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    requests[event.stream_id] = dict(event.headers)
+                    with self.lock:
+                        self.streams += 1
+                        self.max_open_streams = max(self.max_open_streams, len(requests))
+                elif isinstance(event, h2.events.DataReceived):
+                    conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+                elif isinstance(event, h2.events.StreamEnded):
+                    finished.append(event.stream_id)
+            ### Answering only after every request of the batch has been received keeps the streams open at the same time
+            for stream_id in finished:
+                headers = requests.pop(stream_id)
+                body = json.dumps({'Resources': [{'id': str(i), 'displayName': f'sp_{i}'} for i in range(500)]}).encode()
+                response_headers = [(':status', '200'), ('content-type', 'application/json')]
+                if 'gzip' in headers.get('accept-encoding', ''):
+                    body = gzip.compress(body)
+                    response_headers.append(('content-encoding', 'gzip'))
+                response_headers.append(('content-length', str(len(body))))
+                conn.send_headers(stream_id, response_headers)
+                conn.send_data(stream_id, body, end_stream=True)
+            sock.sendall(conn.data_to_send())
+
+    def close(self) -> None:
+        self.listener.close()
+
+
+@unittest.skipIf(h2 is None, "HTTP/2 tests require 'httpx[http2]'")
+class Http2TransportTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.certfile = f"{cls.tmpdir.name}/cert.pem"
+        cls.keyfile = f"{cls.tmpdir.name}/key.pem"
+        subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-keyout', cls.keyfile, '-out', cls.certfile,
+                        '-days', '1', '-subj', '/CN=127.0.0.1'], check=True, capture_output=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def setUp(self):
+        self.server = Http2StandIn(self.certfile, self.keyfile)
+        self.transport = Http2Transport(verify = False)
+
+    def tearDown(self):
+        self.transport.close()
+        self.server.close()
+
+    def test_concurrent_requests_share_one_connection(self):
+        url = f"{self.server.url}/api/2.0/preview/scim/v2/ServicePrincipals"
+        with ThreadPoolExecutor(max_workers = 20) as executor:
+            responses = list(executor.map(lambda _: self.transport.request('GET', url), range(20)))
+
+        self.assertTrue(all(resp.status_code == 200 for resp in responses))
+        self.assertTrue(all(resp.http_version == 'HTTP/2' for resp in responses))
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(self.server.streams, 20)
+        self.assertGreater(self.server.max_open_streams, 1)
+
+    def test_read_timeout_on_hung_socket(self):
+        listener = socket.create_server(('127.0.0.1', 0))
+        self.addCleanup(listener.close)
+        transport = Http2Transport(connect_timeout = 0.5, read_timeout = 0.5, verify = False)
+        self.addCleanup(transport.close)
+
+        with self.assertRaises(TransportTimeout):
+            transport.request('GET', f"https://127.0.0.1:{listener.getsockname()[1]}/api/2.0/preview/scim/v2/Groups")
+
+    def test_gzip_response_is_decoded(self):
+        resp = self.transport.request('GET', f"{self.server.url}/api/2.0/preview/scim/v2/ServicePrincipals")
+        self.assertEqual(resp.headers['content-encoding'], 'gzip')
+        self.assertEqual(len(resp.json()['Resources']), 500)
+
+
+class RequestsTransportTest(unittest.TestCase):
+    def test_read_timeout_on_hung_socket(self):
+        listener = socket.create_server(('127.0.0.1', 0))
+        self.addCleanup(listener.close)
+        transport = RequestsTransport(connect_timeout = 1, read_timeout = 0.5)
+
+        start = time.monotonic()
+        with self.assertRaises(TransportTimeout):
+            transport.request('GET', f"http://127.0.0.1:{listener.getsockname()[1]}/api/2.0/preview/scim/v2/Groups")
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_refused_connection_raises_transport_error(self):
+        listener = socket.create_server(('127.0.0.1', 0))
+        port = listener.getsockname()[1]
+        listener.close()
+
+        with self.assertRaises(TransportError):
+            RequestsTransport(connect_timeout = 1, read_timeout = 1).request('GET', f"http://127.0.0.1:{port}/api/2.0/preview/scim/v2/Groups")
+
+    def test_pool_is_sized_for_concurrency(self):
+        transport = RequestsTransport(pool_maxsize = 40)
+        self.assertEqual(transport.session.get_adapter('https://adb-1.azuredatabricks.net')._pool_maxsize, 40)
+
+    def test_transport_without_request_fails_on_creation(self):
+        class BrokenTransport(Transport):
+            pass
+
+        with self.assertRaises(TypeError):
+            BrokenTransport()
+
+
+if __name__ == '__main__':
+    unittest.main()